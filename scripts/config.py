@@ -12,6 +12,9 @@ NETWORK_IDS = {
     'mantle': '/5000'
 }
 
+# Time window used to bucket transactions for order-arrival and wallet-flow features
+TIME_WINDOW = '4H'
+
 
 def init_session():
     """
@@ -62,6 +65,12 @@ DEFAULT_CONFIG = {
     # Chart appearance settings
     'dark_mode': True,  # Enable or disable dark mode for charts
 
+    # Stage cache settings
+    'cache_dir': '.stage_cache',  # Directory where intermediate stage outputs are stored
+    'cache_max_bytes': 512 * 1024 * 1024,  # Maximum cache size before least recently used outputs are evicted
+    'cache_ttl': 3600,  # Seconds before cached API responses expire and the data is fetched again
+    'refresh_data': False,  # Re-fetch data from the API instead of using cached responses
+
     # Headers for network requests, with a randomized User-Agent to avoid rate limiting
     'headers': {
         "User-Agent": f"Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -203,11 +203,13 @@ class DataAcquisition:
             return pd.DataFrame(), pd.DataFrame()
 
 
-def clean_transaction_data(df_transactions):
+def clean_transaction_data(df_transactions, wallet_index=None):
     """
     Cleans the transaction data by expanding nested columns and normalizing values.
     
     :param df_transactions: Raw transaction DataFrame.
+    :param wallet_index: Optional WalletIndex updated with the cleaned rows. The rows are indexed
+                         as if appended to the frame it was built from, so pass only new transactions.
     :return: Cleaned DataFrame.
     """
     df_tran_cleaned = df_transactions.copy()
@@ -237,6 +239,9 @@ def clean_transaction_data(df_transactions):
 
     # Now, we can safely drop duplicates
     df_tran_cleaned = df_tran_cleaned.drop_duplicates()
+
+    if wallet_index is not None:
+        wallet_index.update(df_tran_cleaned)
     
     return df_tran_cleaned
 
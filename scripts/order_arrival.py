@@ -0,0 +1,400 @@
+import logging
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from scipy.stats import expon, gamma, weibull_min, pareto, burr, lognorm, beta
+from sklearn.cluster import KMeans
+from sklearn.decomposition import PCA
+from sklearn.metrics import silhouette_score
+from sklearn.preprocessing import StandardScaler
+
+from scripts.config import TIME_WINDOW
+
+
+# Order sides and the counterparty flow each one waits for: 1 = PT input orders, 0 = all others
+SIDES = {
+    'BUY_YT': 0,
+    'SELL_PT': 0,
+    'SELL_YT': 1,
+    'BUY_PT': 1
+}
+
+DISTRIBUTIONS = {
+    'Exponential': expon,
+    'Gamma': gamma,
+    'Weibull': weibull_min,
+    'Pareto': pareto,
+    'Burr': burr,
+    'LogNormal': lognorm,
+    'Beta': beta
+}
+
+MIN_TRANSACTIONS = 100
+MIN_ORDERS = 8
+
+
+def get_side_flag(side):
+    """
+    Map an order side to the counterparty flow flag used to filter transactions.
+
+    :param side: One of 'BUY_YT', 'SELL_YT', 'BUY_PT', 'SELL_PT'.
+    :return: 1 if the side waits for PT input orders, 0 otherwise.
+    :raises ValueError: If the side is not supported.
+    """
+    flag = SIDES.get(side.upper())
+    if flag is None:
+        raise ValueError(f"Unsupported order side: {side}. Must be one of {', '.join(SIDES)}")
+    return flag
+
+
+def prepare_transactions(df):
+    """
+    Parse and sort the cleaned transaction data once so it can be shared by every combination.
+
+    :param df: Cleaned transaction DataFrame.
+    :return: Sorted DataFrame with 'buy_sell' and 'time_window' helper columns.
+    :raises KeyError: If a required column is missing.
+    """
+    required_columns = ['timestamp', 'input_baseType', 'valuation_acc']
+    for col in required_columns:
+        if col not in df.columns:
+            raise KeyError(f"Required column '{col}' not found in DataFrame.")
+
+    df = df.copy()
+    df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True)
+    df = df.sort_values('timestamp', kind='mergesort').reset_index(drop=True)
+
+    # Define 'buy_sell' column: PT = 1, others = 0
+    df['buy_sell'] = (df['input_baseType'] == 'PT').astype(int)
+    df['time_window'] = df['timestamp'].dt.floor(TIME_WINDOW)
+    return df
+
+
+def filter_orders(df_prepared, flag, min_amount):
+    """
+    Select the counterparty orders for one side flag at or above a size threshold.
+
+    :param df_prepared: Output of prepare_transactions.
+    :param flag: Side flag returned by get_side_flag.
+    :param min_amount: Minimum 'valuation_acc' of an order.
+    :return: Filtered DataFrame with the 'inter_arrival' column (seconds, NaN at each window start).
+    """
+    df_orders = df_prepared[
+        (df_prepared['buy_sell'] == flag) &
+        (df_prepared['valuation_acc'] >= min_amount)
+    ].copy()
+
+    # Inter-arrival times within each time window, computed once instead of per feature
+    seconds = df_orders['timestamp'].diff().dt.total_seconds()
+    same_window = df_orders['time_window'].eq(df_orders['time_window'].shift())
+    df_orders['inter_arrival'] = seconds.where(same_window)
+    return df_orders
+
+
+def extract_features(df, current_time):
+    """
+    Extract statistical features from the transaction data.
+
+    :param df: Filtered orders returned by filter_orders.
+    :param current_time: Timezone-aware timestamp the features are computed as of.
+    :return: DataFrame of features indexed by time window.
+    """
+    grouped = df.groupby('time_window')
+    inter_arrival = grouped['inter_arrival']
+
+    feature_df = pd.DataFrame()
+    feature_df['order_count'] = grouped.size()
+    feature_df['mean_inter_arrival'] = inter_arrival.mean()
+    feature_df['std_inter_arrival'] = inter_arrival.std()
+    feature_df['hour'] = feature_df.index.hour
+    feature_df['weekday'] = feature_df.index.weekday
+    feature_df['min_inter_arrival'] = inter_arrival.min()
+    feature_df['max_inter_arrival'] = inter_arrival.max()
+    feature_df['median_inter_arrival'] = inter_arrival.median()
+    feature_df['skew_inter_arrival'] = inter_arrival.skew()
+    feature_df['kurtosis_inter_arrival'] = inter_arrival.apply(lambda x: x.kurtosis())
+    feature_df['total_time_span'] = (grouped['timestamp'].max() - grouped['timestamp'].min()).dt.total_seconds()
+
+    # Fee-related Features
+    if 'implicitSwapFeeSy' in df.columns and 'explicitSwapFeeSy' in df.columns:
+        feature_df['total_swap_fee_sy'] = grouped[['implicitSwapFeeSy', 'explicitSwapFeeSy']].sum().sum(axis=1)
+        feature_df['avg_swap_fee_sy'] = grouped[['implicitSwapFeeSy', 'explicitSwapFeeSy']].mean().mean(axis=1)
+    else:
+        logging.warning("Fee-related columns not found. Skipping fee feature engineering.")
+        feature_df['total_swap_fee_sy'] = 0
+        feature_df['avg_swap_fee_sy'] = 0
+
+    # User Interaction Features
+    if 'user' in df.columns:
+        feature_df['unique_users'] = grouped['user'].nunique()
+    else:
+        logging.warning("Column 'user' not found. Skipping user interaction features.")
+        feature_df['unique_users'] = 0
+
+    # Action-Based Features
+    if 'action' in df.columns:
+        feature_df['swap_pt_count'] = (df['action'] == 'SWAP_PT').groupby(df['time_window']).sum()
+    else:
+        logging.warning("Column 'action' not found. Skipping action-based features.")
+        feature_df['swap_pt_count'] = 0
+
+    # Market-Based Features
+    if 'market_symbol' in df.columns and 'market_expiry' in df.columns:
+        feature_df['unique_market_symbols'] = grouped['market_symbol'].nunique()
+        feature_df['days_until_expiry'] = grouped['market_expiry'].apply(lambda x: (pd.to_datetime(x, utc=True).max() - current_time).days)
+    else:
+        logging.warning("Market-related columns not found. Skipping market-based features.")
+        feature_df['unique_market_symbols'] = 0
+        feature_df['days_until_expiry'] = 0
+
+    # Valuation Features
+    if 'valuation_usd' in df.columns:
+        feature_df['total_valuation_usd'] = grouped['valuation_usd'].sum()
+        feature_df['avg_valuation_usd'] = grouped['valuation_usd'].mean()
+    else:
+        logging.warning("Column 'valuation_usd' not found. Skipping valuation features.")
+        feature_df['total_valuation_usd'] = 0
+        feature_df['avg_valuation_usd'] = 0
+
+    # Address-Type Features
+    if 'input_baseType' in df.columns and 'output_baseType' in df.columns:
+        feature_df['unique_input_baseType'] = grouped['input_baseType'].nunique()
+        feature_df['unique_output_baseType'] = grouped['output_baseType'].nunique()
+    else:
+        logging.warning("Address-Type columns not found. Skipping address-type features.")
+        feature_df['unique_input_baseType'] = 0
+        feature_df['unique_output_baseType'] = 0
+
+    # Handle missing values
+    feature_df.fillna(method='ffill', inplace=True)
+    feature_df.fillna(method='bfill', inplace=True)
+
+    # Additional Feature Engineering
+    feature_df['rolling_mean_inter_arrival'] = feature_df['mean_inter_arrival'].rolling(window=3).mean()
+    feature_df['rolling_std_inter_arrival'] = feature_df['mean_inter_arrival'].rolling(window=3).std()
+    feature_df['lag_order_count'] = feature_df['order_count'].shift(1)
+    feature_df['lag_mean_inter_arrival'] = feature_df['mean_inter_arrival'].shift(1)
+
+    # Fill new missing values after feature engineering
+    feature_df.fillna(method='ffill', inplace=True)
+    feature_df.fillna(method='bfill', inplace=True)
+
+    # Statistics undefined in every window (e.g., kurtosis with fewer than 4 orders) stay NaN
+    feature_df.fillna(0, inplace=True)
+
+    return feature_df
+
+
+def reduce_dimensionality(features_scaled, variance_threshold=0.95):
+    """
+    Apply PCA for dimensionality reduction to improve clustering performance.
+    """
+    pca = PCA(n_components=variance_threshold, random_state=42)
+    features_pca = pca.fit_transform(features_scaled)
+    logging.info(f"PCA reduced features to {features_pca.shape[1]} dimensions explaining {variance_threshold*100}% variance.")
+    return features_pca, pca
+
+
+def determine_optimal_k(features_scaled, k_min=2, k_max=10):
+    """
+    Determine the optimal number of clusters using the Silhouette Score.
+    """
+    # Silhouette requires fewer clusters than samples
+    k_max = min(k_max, len(features_scaled) - 1)
+    if k_max < k_min:
+        return 1
+
+    K_range = range(k_min, k_max + 1)
+    silhouette_scores = []
+    for k in K_range:
+        kmeans = KMeans(n_clusters=k, random_state=42)
+        labels = kmeans.fit_predict(features_scaled)
+        silhouette_scores.append(silhouette_score(features_scaled, labels))
+
+    optimal_k_silhouette = K_range[int(np.argmax(silhouette_scores))]
+    logging.info(f"Optimal number of clusters determined: {optimal_k_silhouette} (Silhouette Score)")
+    return optimal_k_silhouette
+
+
+def fit_distribution(name, dist, data):
+    """
+    Fit a single distribution and score it with BIC.
+
+    :return: Tuple (name, {'params', 'bic'}) or None if the fit is unusable.
+    """
+    try:
+        params = dist.fit(data)
+        expected_inter_arrival = dist.mean(*params)
+        if not np.isfinite(expected_inter_arrival) or expected_inter_arrival <= 0:
+            return None
+        log_likelihood = np.sum(dist.logpdf(data, *params))
+        k_params = len(params)
+        bic = k_params * np.log(len(data)) - 2 * log_likelihood
+        return (name, {'params': params, 'bic': bic})
+    except Exception as e:
+        logging.warning(f"Error fitting {name}: {e}")
+        return None
+
+
+def fit_distributions_parallel(inter_arrival_times, distributions, n_jobs=-1):
+    """
+    Fit distributions in parallel to speed up the process.
+
+    :param n_jobs: Number of joblib workers; use 1 when already running inside a parallel worker.
+    """
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(fit_distribution)(name, dist, inter_arrival_times)
+        for name, dist in distributions.items()
+    )
+
+    # Filter out failed fits
+    fit_results = {name: info for result in results if result is not None for name, info in [result]}
+    return fit_results
+
+
+def predict_next_order_time(current_time, last_order_time, best_dist, best_params):
+    """
+    Predict the next order arrival time based on the fitted distribution.
+    """
+    time_since_last_order = (current_time - last_order_time).total_seconds()
+    expected_inter_arrival = best_dist.mean(*best_params)
+
+    # Calculate time until next order
+    time_until_next_order = expected_inter_arrival - time_since_last_order
+    if time_until_next_order < 0:
+        time_until_next_order = expected_inter_arrival
+
+    next_order_time = current_time + pd.Timedelta(seconds=time_until_next_order)
+    return next_order_time, time_until_next_order
+
+
+def model_order_arrival(df_orders, current_time, distributions=DISTRIBUTIONS):
+    """
+    Cluster the time windows of one order stream, fit inter-arrival distributions per cluster
+    and predict the next arrival for the current time window.
+
+    :param df_orders: Filtered orders returned by filter_orders.
+    :param current_time: Timezone-aware timestamp the prediction is made for.
+    :param distributions: Candidate scipy distributions keyed by name.
+    :return: Dictionary describing the prediction and the fitted distribution.
+    """
+    feature_df = extract_features(df_orders, current_time)
+    feature_columns = feature_df.columns.tolist()
+
+    scaler = StandardScaler()
+    features_scaled = scaler.fit_transform(feature_df)
+    features_pca, pca = reduce_dimensionality(features_scaled, variance_threshold=0.95)
+    optimal_k = determine_optimal_k(features_pca, k_min=2, k_max=10)
+    kmeans = KMeans(n_clusters=optimal_k, random_state=42)
+    feature_df['cluster'] = kmeans.fit_predict(features_pca)
+
+    df_orders = df_orders.merge(feature_df['cluster'], left_on='time_window', right_index=True, how='left')
+
+    # Current window features: historical averages with the current hour and weekday
+    current_features = feature_df[feature_columns].mean()
+    current_features['hour'] = current_time.hour
+    current_features['weekday'] = current_time.weekday()
+    current_features_df = pd.DataFrame([current_features], columns=feature_columns)
+    current_features_pca = pca.transform(scaler.transform(current_features_df))
+    current_cluster = int(kmeans.predict(current_features_pca)[0])
+
+    result = {'n_orders': len(df_orders), 'n_clusters': optimal_k, 'cluster': current_cluster}
+
+    # Only the current cluster's distribution is needed for the prediction
+    df_segment = df_orders[df_orders['cluster'] == current_cluster]
+    inter_arrival_times = df_segment['timestamp'].diff().dt.total_seconds()
+    inter_arrival_times = inter_arrival_times[inter_arrival_times > 0].values
+    if len(inter_arrival_times) < MIN_ORDERS:
+        return {**result, 'status': "Not enough data in the current segment to make a prediction."}
+
+    fit_results = fit_distributions_parallel(inter_arrival_times, distributions, n_jobs=1)
+    if not fit_results:
+        return {**result, 'status': "No suitable distribution found."}
+
+    best_fit_name, best_fit_info = min(fit_results.items(), key=lambda x: x[1]['bic'])
+    next_order_time, time_until_next_order = predict_next_order_time(
+        current_time, df_segment['timestamp'].max(), distributions[best_fit_name], best_fit_info['params'])
+
+    return {
+        **result,
+        'distribution': best_fit_name,
+        'params': best_fit_info['params'],
+        'bic': best_fit_info['bic'],
+        'next_order_time': next_order_time,
+        'seconds_until_next_order': time_until_next_order,
+        'status': 'ok'
+    }
+
+
+def safe_model_order_arrival(df_orders, current_time):
+    """
+    Run model_order_arrival, turning a modeling failure into a status so other streams are kept.
+    """
+    try:
+        return model_order_arrival(df_orders, current_time)
+    except Exception as e:
+        logging.warning(f"Order arrival modeling failed: {e}")
+        return {'n_orders': len(df_orders), 'status': f"Modeling failed: {e}"}
+
+
+def predict_order_arrivals(df_tran_cleaned, combinations, n_jobs=-1, current_time=None):
+    """
+    Predict the next counterparty order arrival for several (side, min_amount) combinations in one pass.
+
+    The transaction data is parsed and sorted once, and combinations that watch the same
+    counterparty flow at the same threshold (e.g., BUY_YT and SELL_PT) share a single model.
+
+    :param df_tran_cleaned: Cleaned transaction DataFrame (see clean_transaction_data).
+    :param combinations: Iterable of (side, min_amount) tuples, side being one of SIDES.
+    :param n_jobs: Number of joblib workers used to model combinations in parallel.
+    :param current_time: Timestamp to predict from (converted to UTC; naive values are taken as UTC); defaults to now.
+    :return: DataFrame with one row per requested combination.
+    """
+    combinations = [(side.upper(), min_amount) for side, min_amount in combinations]
+    flags = {side: get_side_flag(side) for side, _ in combinations}
+    current_time = pd.Timestamp(current_time) if current_time is not None else pd.Timestamp.utcnow()
+    # Window features are bucketed in UTC, so the current hour and weekday must be too
+    current_time = current_time.tz_localize('UTC') if current_time.tzinfo is None else current_time.tz_convert('UTC')
+
+    df_prepared = prepare_transactions(df_tran_cleaned)
+    streams = sorted({(flags[side], min_amount) for side, min_amount in combinations})
+
+    stream_results = {}
+    to_model = []
+    for flag, min_amount in streams:
+        df_orders = filter_orders(df_prepared, flag, min_amount)
+        if df_orders.empty:
+            stream_results[(flag, min_amount)] = {'n_orders': 0, 'status': "No orders above the threshold."}
+        elif len(df_prepared) < MIN_TRANSACTIONS:
+            stream_results[(flag, min_amount)] = {'n_orders': len(df_orders), 'status': f"Not enough transactions in the dataset. At least {MIN_TRANSACTIONS} required."}
+        elif len(df_orders) < MIN_ORDERS:
+            stream_results[(flag, min_amount)] = {'n_orders': len(df_orders), 'status': f"Not enough orders above the threshold. At least {MIN_ORDERS} required."}
+        else:
+            to_model.append(((flag, min_amount), df_orders))
+
+    modeled = Parallel(n_jobs=n_jobs)(
+        delayed(safe_model_order_arrival)(df_orders, current_time) for _, df_orders in to_model
+    )
+    stream_results.update({stream: result for (stream, _), result in zip(to_model, modeled)})
+
+    rows = [
+        {'side': side, 'min_amount': min_amount, **stream_results[(flags[side], min_amount)]}
+        for side, min_amount in combinations
+    ]
+    columns = ['side', 'min_amount', 'n_orders', 'n_clusters', 'cluster', 'distribution', 'params', 'bic',
+               'next_order_time', 'seconds_until_next_order', 'status']
+    return pd.DataFrame(rows, columns=columns)
+
+
+# Example usage
+if __name__ == "__main__":
+    from scripts.config import load_config
+    from scripts.data_acquisition import DataAcquisition, clean_transaction_data
+
+    config = load_config()
+    data_acquisition = DataAcquisition(config['market_contract'], config['yt_contract'], config['start_time'], config['network'])
+    _, df_transactions = data_acquisition.run()
+    df_cleaned_transactions = clean_transaction_data(df_transactions)
+
+    combinations = [(side, amount) for side in SIDES for amount in (0.01, 1, 10)]
+    print(predict_order_arrivals(df_cleaned_transactions, combinations))
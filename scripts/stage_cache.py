@@ -0,0 +1,193 @@
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import tempfile
+import time
+
+
+class ArtifactStore:
+    def __init__(self, cache_dir, max_bytes):
+        """
+        Initializes the ArtifactStore, a local directory of pickled stage outputs.
+
+        :param cache_dir: Directory where artifacts are stored (created if missing).
+        :param max_bytes: Maximum total size of the store; least recently used artifacts are evicted beyond it.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        """Return the file path of the artifact stored under the given key."""
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def load(self, key):
+        """
+        Read the serialized artifact for a key and mark it as recently used.
+
+        :param key: The artifact key.
+        :return: The artifact bytes, or None if the key is not in the store.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                payload = f.read()
+        except FileNotFoundError:
+            return None
+        # The modification time doubles as the last-access time for LRU eviction
+        os.utime(path)
+        return payload
+
+    def save(self, key, payload):
+        """
+        Atomically write a serialized artifact and evict old entries if the store is over budget.
+
+        :param key: The artifact key.
+        :param payload: The artifact bytes.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, self._path(key))
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        """
+        Remove least recently used artifacts until the store fits within max_bytes.
+
+        :param keep: A key that must not be evicted (e.g., the artifact just written).
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.pkl'):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if name == f"{keep}.pkl":
+                continue
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+
+
+class Stage:
+    def __init__(self, name, func, config_keys=(), upstream=(), cache=True, modules=(), max_age=None,
+                 cacheable=None):
+        """
+        Declares a node of the analysis DAG.
+
+        :param name: Unique name of the stage.
+        :param func: Callable invoked as func(*upstream_outputs, **config_values).
+        :param config_keys: Config keys the stage reads; only these enter its cache key.
+        :param upstream: Names of the stages whose outputs are passed to func, in order.
+        :param cache: Whether the output is persisted in the artifact store.
+        :param modules: Modules the stage relies on; their source enters the cache key together with func's.
+        :param max_age: Maximum age in seconds of a cached output, for stages reading time-dependent sources.
+        :param cacheable: Optional predicate on the output; outputs it rejects (e.g., failed fetches) are not stored.
+        """
+        self.name = name
+        self.func = func
+        self.config_keys = tuple(config_keys)
+        self.upstream = tuple(upstream)
+        self.cache = cache
+        self.modules = tuple(modules)
+        self.max_age = max_age
+        self.cacheable = cacheable
+
+    def code_fingerprint(self):
+        """Hash the source of the stage function and its declared modules."""
+        sha = hashlib.sha256()
+        for obj in (self.func, *self.modules):
+            try:
+                source = inspect.getsource(obj)
+            except (OSError, TypeError):
+                source = getattr(obj, '__qualname__', getattr(obj, '__name__', repr(obj)))
+            sha.update(source.encode())
+        return sha.hexdigest()
+
+    def time_bucket(self):
+        """Return the current max_age period, so cached outputs expire once it rolls over."""
+        if self.max_age is None:
+            return None
+        return int(time.time() // self.max_age)
+
+
+class StagePipeline:
+    def __init__(self, config, store, refresh=()):
+        """
+        Initializes the StagePipeline, which runs stages with content-addressed memoization.
+
+        A stage's key hashes its name, code, the config values it uses, the content
+        fingerprints of its upstream outputs and, for stages with a max_age, the current
+        time period, so a parameter change only recomputes the stages downstream of it.
+
+        :param config: The loaded configuration dictionary.
+        :param store: The ArtifactStore used to persist stage outputs.
+        :param refresh: Names of stages to recompute even if a cached output exists.
+        """
+        self.config = config
+        self.store = store
+        self.refresh = set(refresh)
+        self.stages = {}
+        self._results = {}
+
+    def add(self, stage):
+        """Register a stage; its upstream stages must already be registered."""
+        for name in stage.upstream:
+            if name not in self.stages:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{name}'")
+        self.stages[stage.name] = stage
+        return stage
+
+    def _stage_key(self, stage, upstream_fingerprints):
+        """Compute the cache key of a stage from its code, config inputs and upstream data."""
+        config_values = {key: self.config[key] for key in stage.config_keys}
+        material = json.dumps({
+            'stage': stage.name,
+            'code': stage.code_fingerprint(),
+            'config': config_values,
+            'upstream': upstream_fingerprints,
+            'period': stage.time_bucket(),
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def run(self, name):
+        """
+        Return the output of a stage, loading it from the store or computing it (and its
+        upstream stages) as needed.
+
+        :param name: The stage name.
+        :return: The stage output.
+        """
+        if name in self._results:
+            return self._results[name][0]
+
+        stage = self.stages[name]
+        upstream_outputs = [self.run(dep) for dep in stage.upstream]
+        upstream_fingerprints = [self._results[dep][1] for dep in stage.upstream]
+        key = self._stage_key(stage, upstream_fingerprints)
+
+        payload = None
+        if stage.cache and name not in self.refresh:
+            payload = self.store.load(key)
+
+        if payload is not None:
+            output = pickle.loads(payload)
+        else:
+            config_values = {k: self.config[k] for k in stage.config_keys}
+            output = stage.func(*upstream_outputs, **config_values)
+            if stage.cache:
+                payload = pickle.dumps(output, protocol=pickle.HIGHEST_PROTOCOL)
+                if stage.cacheable is None or stage.cacheable(output):
+                    self.store.save(key, payload)
+
+        # Downstream keys use the hash of the output content, falling back to this stage's key
+        fingerprint = hashlib.sha256(payload).hexdigest() if payload is not None else key
+        self._results[name] = (output, fingerprint)
+        return output
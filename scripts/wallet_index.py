@@ -0,0 +1,203 @@
+import pandas as pd
+
+from scripts.config import TIME_WINDOW
+
+
+TRADED_BASE_TYPES = ('YT', 'PT')
+TOTAL_FIELDS = ('count', 'valuation_usd')
+
+
+def get_trade_side(input_base_type, output_base_type):
+    """
+    Classify a swap row by the YT/PT leg it trades.
+
+    :param input_base_type: The 'input_baseType' of the row.
+    :param output_base_type: The 'output_baseType' of the row.
+    :return: 'BUY_YT', 'SELL_YT', 'BUY_PT', 'SELL_PT', or None for other swaps.
+    """
+    if output_base_type in TRADED_BASE_TYPES:
+        return f"BUY_{output_base_type}"
+    if input_base_type in TRADED_BASE_TYPES:
+        return f"SELL_{input_base_type}"
+    return None
+
+
+def collapse_transactions(df_rows):
+    """
+    Collapse the per-leg rows produced by expand_rows back to one row per transaction 'id'.
+
+    :param df_rows: Cleaned transaction rows.
+    :return: DataFrame indexed by 'id' with user, timestamp, valuation_usd and the first YT/PT side.
+    """
+    rows = pd.DataFrame({
+        'id': df_rows['id'].values,
+        'user': df_rows['user'].values,
+        'timestamp': pd.to_datetime(df_rows['timestamp'], utc=True).reset_index(drop=True),
+        'side': [get_trade_side(i, o) for i, o in zip(df_rows['input_baseType'], df_rows['output_baseType'])],
+        'valuation_usd': pd.to_numeric(df_rows['valuation_usd'], errors='coerce').fillna(0).values
+    })
+    # 'first' skips missing values, so each transaction keeps the side of its first YT/PT leg
+    return rows.groupby('id', sort=False).agg(user=('user', 'first'), timestamp=('timestamp', 'first'),
+                                               side=('side', 'first'), valuation_usd=('valuation_usd', 'first'))
+
+
+class WalletIndex:
+    def __init__(self):
+        """
+        Initializes an empty WalletIndex, mapping each wallet ('user') to its row offsets in the
+        cleaned transaction DataFrame together with running per-side totals.
+
+        Offsets are positional (for use with .iloc) into the cleaned frame as it was indexed, so new
+        transactions must be appended to that frame in the same order. Frames that were re-sorted or
+        merged (e.g., df_merged) are rejected by the query methods rather than silently misread.
+        Totals count each transaction 'id' once, even when cleaning expanded it into several legs.
+        """
+        self.n_rows = 0
+        self.rows = {}
+        self.totals = {}
+        self.seen_ids = set()
+        self._rankings = {}
+
+    def update(self, df_cleaned):
+        """
+        Index a batch of cleaned transactions appended after the rows already indexed.
+
+        :param df_cleaned: Cleaned transaction rows, in the order they appear in the full frame.
+        :raises KeyError: If a required column is missing.
+        """
+        required_columns = ['id', 'user', 'timestamp', 'input_baseType', 'output_baseType', 'valuation_usd']
+        for col in required_columns:
+            if col not in df_cleaned.columns:
+                raise KeyError(f"Required column '{col}' not found in DataFrame.")
+
+        users = pd.Series(df_cleaned['user'].values)
+        offsets = pd.Series(range(self.n_rows, self.n_rows + len(df_cleaned)))
+        self.n_rows += len(df_cleaned)
+        for user, positions in offsets.groupby(users, sort=False).indices.items():
+            # Offsets only grow between batches, so extending keeps each list sorted
+            self.rows.setdefault(user, []).extend(offsets.values[positions].tolist())
+
+        transactions = collapse_transactions(df_cleaned)
+        # Test the set directly so an update costs O(batch), not O(all transactions seen)
+        is_new = pd.Series([tx_id not in self.seen_ids for tx_id in transactions.index], index=transactions.index, dtype=bool)
+        transactions = transactions[is_new].dropna(subset=['user'])
+        self.seen_ids.update(transactions.index)
+        if transactions.empty:
+            return
+
+        wallet_totals = transactions.groupby('user', sort=False).agg(
+            first_timestamp=('timestamp', 'min'), last_timestamp=('timestamp', 'max'),
+            count=('timestamp', 'size'), valuation_usd=('valuation_usd', 'sum'))
+        side_totals = transactions.groupby(['user', 'side'])['valuation_usd'].agg(['size', 'sum'])
+
+        for user, batch_totals in wallet_totals.iterrows():
+            totals = self.totals.get(user)
+            if totals is None:
+                totals = {'first_timestamp': batch_totals['first_timestamp'], 'last_timestamp': batch_totals['last_timestamp'],
+                          'count': 0, 'valuation_usd': 0.0}
+                totals.update({f"{side}_{field}": 0 for side in self.sides() for field in TOTAL_FIELDS})
+                self.totals[user] = totals
+            else:
+                totals['first_timestamp'] = min(totals['first_timestamp'], batch_totals['first_timestamp'])
+                totals['last_timestamp'] = max(totals['last_timestamp'], batch_totals['last_timestamp'])
+            totals['count'] += int(batch_totals['count'])
+            totals['valuation_usd'] += float(batch_totals['valuation_usd'])
+
+        for (user, side), (size, total) in side_totals.iterrows():
+            self.totals[user][f"{side}_count"] += int(size)
+            self.totals[user][f"{side}_valuation_usd"] += float(total)
+
+        self._rankings.clear()
+
+    @staticmethod
+    def sides():
+        """Return the trade sides tracked in the running totals."""
+        return [f"{direction}_{base_type}" for base_type in TRADED_BASE_TYPES for direction in ('BUY', 'SELL')]
+
+    def offsets(self, user):
+        """
+        Return the sorted row offsets of a wallet.
+
+        :param user: The wallet address.
+        :return: List of positional offsets into the cleaned DataFrame (empty if unknown).
+        """
+        return self.rows.get(user, [])
+
+    def _select(self, df_cleaned, users):
+        """
+        Return the rows of the given wallets, checking that df_cleaned is the frame the index was built from.
+
+        :raises ValueError: If the frame length or the wallets at the indexed offsets do not match.
+        """
+        if len(df_cleaned) != self.n_rows:
+            raise ValueError(f"DataFrame has {len(df_cleaned)} rows but the wallet index covers {self.n_rows}; "
+                             "pass the cleaned frame the index was built from.")
+        offsets = sorted(offset for user in users for offset in self.offsets(user))
+        df_rows = df_cleaned.iloc[offsets]
+        if not df_rows['user'].isin(users).all():
+            raise ValueError("DataFrame rows are not in the order the wallet index was built from; "
+                             "pass the cleaned frame the index was built from.")
+        return df_rows
+
+    def history(self, df_cleaned, user):
+        """
+        Return all cleaned transactions of a wallet without scanning the full frame.
+
+        :param df_cleaned: The cleaned DataFrame the index was built from (not re-sorted or merged).
+        :param user: The wallet address.
+        :return: DataFrame of the wallet's rows.
+        :raises ValueError: If df_cleaned is not the frame the index was built from.
+        """
+        return self._select(df_cleaned, [user])
+
+    def top_wallets(self, side='BUY_YT', n=20, by='valuation_usd'):
+        """
+        Return the largest wallets on one side ranked by their running totals.
+
+        The ranking for each (side, by) is sorted once after an update (O(W log W) over all wallets)
+        and reused, so repeated queries between updates cost O(n).
+
+        :param side: Trade side (e.g., 'BUY_YT'), or None to rank on all trades.
+        :param n: Number of wallets to return.
+        :param by: Total to rank on, 'valuation_usd' or 'count'.
+        :return: DataFrame of wallet totals indexed by user, largest first.
+        """
+        key = f"{side}_{by}" if side else by
+        ranking = self._rankings.get(key)
+        if ranking is None:
+            ranking = sorted((user for user, totals in self.totals.items() if totals[key] > 0),
+                             key=lambda user: self.totals[user][key], reverse=True)
+            self._rankings[key] = ranking
+        top = ranking[:n]
+        return pd.DataFrame([self.totals[user] for user in top], index=pd.Index(top, name='user'))
+
+    def summary(self):
+        """Return the running totals of every wallet as a DataFrame indexed by user."""
+        return pd.DataFrame.from_dict(self.totals, orient='index').rename_axis('user')
+
+    def whale_flow(self, df_cleaned, side='BUY_YT', n=20, freq=TIME_WINDOW):
+        """
+        Aggregate the flow of the top wallets on one side into time windows.
+
+        :param df_cleaned: The cleaned DataFrame the index was built from (not re-sorted or merged).
+        :param side: Trade side used to rank the wallets.
+        :param n: Number of top wallets to include.
+        :param freq: Time window used to bucket the flow; defaults to the TIME_WINDOW of the arrival-time features.
+        :return: DataFrame indexed by every time window with whale activity, holding per-side USD flow,
+                 transaction count and active wallets.
+        :raises ValueError: If df_cleaned is not the frame the index was built from.
+        """
+        users = self.top_wallets(side, n).index.tolist()
+        df_whales = self._select(df_cleaned, users)
+        if df_whales.empty:
+            return pd.DataFrame()
+
+        transactions = collapse_transactions(df_whales)
+        time_window = transactions['timestamp'].dt.floor(freq).rename('time_window')
+        grouped = transactions.groupby(time_window)
+
+        flow_df = grouped.size().to_frame('whale_trade_count')
+        flow_df['whale_unique_users'] = grouped['user'].nunique()
+        side_flow = transactions.groupby([time_window, 'side'])['valuation_usd'].sum().unstack(fill_value=0)
+        side_flow.columns = [f"whale_{col.lower()}_usd" for col in side_flow.columns]
+        return side_flow.reindex(flow_df.index, fill_value=0).join(flow_df)
@@ -1,65 +1,125 @@
 # Import necessary modules
+from scripts import asset_retriever, data_acquisition, wallet_index, yt_calculation
 from scripts.asset_retriever import AssetRetriever
 from scripts.data_acquisition import DataAcquisition, clean_transaction_data
 from scripts.yt_calculation import YTCalculation
 from scripts.plot_strategy import plot_yt_price_points_curve
+from scripts.stage_cache import ArtifactStore, Stage, StagePipeline
+from scripts.wallet_index import WalletIndex
 import pandas as pd
 
-from scripts.config import load_config 
-
-# Load configuration from config.py
-config = load_config()
-
-# Extract the necessary parameters from the loaded config
-network = config['network']
-yt_contract = config['yt_contract']
-market_contract = config['market_contract']
-start_time = config['start_time']
-underlying_amount = config['underlying_amount']
-points_per_hour_per_underlying = config['points_per_hour_per_underlying']
-pendle_multiplier = config['pendle_multiplier']
-mode = 'plotly_dark' if config['dark_mode'] else 'plotly_white'
+from scripts.config import load_config
 
 
 # Step 1: Retrieve Asset Information (Symbol, Maturity)
-asset_retriever = AssetRetriever(network, 'YT', yt_contract)
-try:
-    symbol, maturity = asset_retriever.get_asset_details()
-    print(f"Retrieved Asset - Symbol: {symbol}, Maturity Date: {maturity}")
-except ValueError as e:
-    print(f"Error retrieving asset details: {e}")
+def retrieve_asset(network, yt_contract):
+    retriever = AssetRetriever(network, 'YT', yt_contract)
+    return retriever.get_asset_details()
+
 
 # Step 2: Fetch Data Using DataAcquisition
-data_acquisition = DataAcquisition(market_contract, yt_contract, start_time, network)
-df_combined, df_transactions = data_acquisition.run()
+def acquire_data(market_contract, yt_contract, start_time, network):
+    acquisition = DataAcquisition(market_contract, yt_contract, start_time, network)
+    return acquisition.run()
+
+
+def has_data(acquired):
+    """Only cache fetches that returned both data sets, so a transient API failure is retried."""
+    df_combined, df_transactions = acquired
+    return not df_combined.empty and not df_transactions.empty
 
-if df_combined.empty or df_transactions.empty:
-    print("No data fetched from the API.")
 
-# Step 3: Clean the Transaction Data
-df_cleaned_transactions = clean_transaction_data(df_transactions)
-if df_cleaned_transactions.empty:
-    print("No valid transactions after cleaning.")
-print(df_cleaned_transactions.columns)
-print(df_combined.columns)
+# Step 3: Clean the Transaction Data and index it by wallet
+def clean_data(acquired):
+    _, df_transactions = acquired
+    wallets = WalletIndex()
+    df_cleaned_transactions = clean_transaction_data(df_transactions, wallet_index=wallets)
+    return df_cleaned_transactions, wallets
+
 
 # Step 4: Merge cleaned transaction data with combined data
-df_cleaned_transactions['timestamp'] = pd.to_datetime(df_cleaned_transactions['timestamp'], utc=True)
-df_combined['timestamp'] = pd.to_datetime(df_combined['Time'], utc=True)
+def merge_data(acquired, cleaned):
+    df_combined = acquired[0].copy()
+    df_cleaned_transactions = cleaned[0].copy()
+    df_cleaned_transactions['timestamp'] = pd.to_datetime(df_cleaned_transactions['timestamp'], utc=True)
+    df_combined['timestamp'] = pd.to_datetime(df_combined['Time'], utc=True)
+
+    # Merge transaction data with combined data based on timestamp
+    df_merged = pd.merge_asof(df_cleaned_transactions.sort_values('timestamp'),
+                                df_combined[['timestamp', 'underlyingApy']],
+                                on='timestamp',
+                                direction='backward')
+    return df_merged, df_combined
 
-# Merge transaction data with combined data based on timestamp
-df_merged = pd.merge_asof(df_cleaned_transactions.sort_values('timestamp'), 
-                            df_combined[['timestamp', 'underlyingApy']],
-                            on='timestamp',
-                            direction='backward')
 
 # Step 5: Perform YT Calculations
-calculation = YTCalculation(df_merged, df_combined, maturity, points_per_hour_per_underlying, underlying_amount, pendle_multiplier)
-df_merged, df_combined, h_range, fair_value_curve, weighted_points = calculation.run_calculations()
+def calculate_yt(asset, merged, points_per_hour_per_underlying, underlying_amount, pendle_multiplier):
+    _, maturity = asset
+    df_merged, df_combined = merged
+    calculation = YTCalculation(df_merged.copy(), df_combined.copy(), maturity, points_per_hour_per_underlying, underlying_amount, pendle_multiplier)
+    return calculation.run_calculations()
+
+
+# Step 6: Plot the YT price, points and fair value curve
+def plot_results(asset, results, network, dark_mode, underlying_amount):
+    symbol, _ = asset
+    df_merged, _, h_range, fair_value_curve, _ = results
+    mode = 'plotly_dark' if dark_mode else 'plotly_white'
+    plot_yt_price_points_curve(df_merged, h_range, fair_value_curve, symbol, network, mode, underlying_amount)
+
+
+def build_pipeline(config):
+    """
+    Declare the analysis DAG. Each stage is keyed on its code and modules, the config values it
+    reads and the fingerprints of its upstream outputs, so only stages affected by a change are recomputed.
+    """
+    store = ArtifactStore(config['cache_dir'], config['cache_max_bytes'])
+    refresh = ['asset', 'acquisition'] if config['refresh_data'] else []
+    pipeline = StagePipeline(config, store, refresh=refresh)
+
+    # API-backed stages expire after cache_ttl since the data they fetch keeps growing
+    pipeline.add(Stage('asset', retrieve_asset, config_keys=['network', 'yt_contract'],
+                       modules=[asset_retriever], max_age=config['cache_ttl']))
+    pipeline.add(Stage('acquisition', acquire_data,
+                       config_keys=['market_contract', 'yt_contract', 'start_time', 'network'],
+                       modules=[data_acquisition], max_age=config['cache_ttl'], cacheable=has_data))
+    pipeline.add(Stage('clean', clean_data, upstream=['acquisition'], modules=[data_acquisition, wallet_index]))
+    pipeline.add(Stage('merge', merge_data, upstream=['acquisition', 'clean']))
+    pipeline.add(Stage('calculation', calculate_yt, upstream=['asset', 'merge'],
+                       config_keys=['points_per_hour_per_underlying', 'underlying_amount', 'pendle_multiplier'],
+                       modules=[yt_calculation]))
+    pipeline.add(Stage('plot', plot_results, upstream=['asset', 'calculation'],
+                       config_keys=['network', 'dark_mode', 'underlying_amount'], cache=False))
+    return pipeline
+
+
+if __name__ == "__main__":
+    # Load configuration from config.py
+    config = load_config()
+    pipeline = build_pipeline(config)
+
+    try:
+        symbol, maturity = pipeline.run('asset')
+        print(f"Retrieved Asset - Symbol: {symbol}, Maturity Date: {maturity}")
+    except ValueError as e:
+        print(f"Error retrieving asset details: {e}")
+        raise SystemExit(1)
+
+    df_combined, df_transactions = pipeline.run('acquisition')
+    if df_combined.empty or df_transactions.empty:
+        print("No data fetched from the API.")
+
+    df_cleaned_transactions, wallets = pipeline.run('clean')
+    if df_cleaned_transactions.empty:
+        print("No valid transactions after cleaning.")
+    print(df_cleaned_transactions.columns)
+    print(df_combined.columns)
+
+    df_merged, df_combined, h_range, fair_value_curve, weighted_points = pipeline.run('calculation')
 
-# Print the calculated data as a result
-print(f"Total Weighted Points Per Underlying: {weighted_points}")
-print(df_merged.head())
-print(df_combined.head())
+    # Print the calculated data as a result
+    print(f"Total Weighted Points Per Underlying: {weighted_points}")
+    print(df_merged.head())
+    print(df_combined.head())
 
-plot_yt_price_points_curve(df_merged, h_range, fair_value_curve, symbol, network, mode, underlying_amount)
\ No newline at end of file
+    pipeline.run('plot')